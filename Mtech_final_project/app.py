@@ -3,6 +3,7 @@ import pandas as pd
 import networkx as nx
 import matplotlib.pyplot as plt
 from io import BytesIO, StringIO
+from model_server import ModelServerClient, server_available
 
 # ---------- Page Config ----------
 st.set_page_config(page_title="🩺 Clinical Disease Predictor", layout="wide")
@@ -43,14 +44,43 @@ st.title("🩺 Disease Prediction from Clinical Notes")
 st.markdown("A hybrid NLP + Knowledge Graph system for accurate disease prediction from unstructured clinical text.")
 
 # ---------- Load Data ----------
+# With model_server.py running, reference data and models live once in the server
+# process instead of in every replica; otherwise fall back to loading them here.
+@st.cache_resource
+def get_model_server_client():
+    return ModelServerClient()
+
+# Checked on every run rather than cached, so a replica that started while the server
+# was down or busy picks it up later
+def get_model_server():
+    return get_model_server_client() if server_available() else None
+
 @st.cache_data
 def load_data():
     return pd.read_csv("sample_clinical_notes_with_predictions.csv")
 
-data = load_data()
+model_server = get_model_server()
 
 # ---------- Prediction Logic ----------
 def match_prediction(note):
+    if model_server:
+        try:
+            return model_server.match_prediction(note)
+        except OSError:
+            pass  # server went away mid-session, answer locally; server-side errors propagate
+    return match_prediction_local(note)
+
+# Bulk uploads go to the server as one request instead of one round trip per row
+def match_predictions(notes):
+    if model_server:
+        try:
+            return model_server.match_many(notes)
+        except OSError:
+            pass
+    return [match_prediction_local(note) for note in notes]
+
+def match_prediction_local(note):
+    data = load_data()
     for _, row in data.iterrows():
         if note.lower().strip() in row['clinical_note'].lower():
             return row['extracted_symptoms'], row['predicted_diseases']
@@ -95,21 +125,24 @@ with tab1:
 
     if st.button("🔍 Analyze Symptoms", key="analyze_single"):
         if user_input.strip():
-            symptoms, diseases = match_prediction(user_input)
-            if symptoms and diseases:
-                st.success("✅ Symptoms and diseases predicted successfully!")
-
-                st.subheader("🧠 Extracted Symptoms")
-                st.markdown(''.join([f"<span class='tag-box'>{s.strip()}</span>" for s in symptoms.split(",")]), unsafe_allow_html=True)
-
-                st.subheader("📋 Predicted Diseases")
-                st.markdown(''.join([f"<span class='tag-box disease'>{d.strip()}</span>" for d in diseases.split(",")]), unsafe_allow_html=True)
-
-                st.subheader("📊 Knowledge Graph")
-                fig = create_graph(symptoms, diseases)
-                st.pyplot(fig)
-            else:
-                st.warning("⚠️ No close match found.")
+            try:
+                symptoms, diseases = match_prediction(user_input)
+                if symptoms and diseases:
+                    st.success("✅ Symptoms and diseases predicted successfully!")
+
+                    st.subheader("🧠 Extracted Symptoms")
+                    st.markdown(''.join([f"<span class='tag-box'>{s.strip()}</span>" for s in symptoms.split(",")]), unsafe_allow_html=True)
+
+                    st.subheader("📋 Predicted Diseases")
+                    st.markdown(''.join([f"<span class='tag-box disease'>{d.strip()}</span>" for d in diseases.split(",")]), unsafe_allow_html=True)
+
+                    st.subheader("📊 Knowledge Graph")
+                    fig = create_graph(symptoms, diseases)
+                    st.pyplot(fig)
+                else:
+                    st.warning("⚠️ No close match found.")
+            except Exception as e:
+                st.error(f"Error: {e}")
         else:
             st.error("❌ Please enter a valid clinical note.")
 
@@ -126,9 +159,9 @@ with tab2:
             else:
                 st.success("✅ File uploaded successfully!")
                 predictions = []
+                notes = input_df['clinical_note'].tolist()
 
-                for note in input_df['clinical_note']:
-                    symptoms, diseases = match_prediction(note)
+                for note, (symptoms, diseases) in zip(notes, match_predictions(notes)):
                     predictions.append({
                         "clinical_note": note,
                         "extracted_symptoms": symptoms if symptoms else "not found",
@@ -0,0 +1,122 @@
+import os
+import sys
+import time
+import argparse
+import subprocess
+import multiprocessing as mp
+import numpy as np
+import pandas as pd
+from model_server import ModelServerClient, SharedResources, wait_for_server, DATA_PATH, SOCKET_PATH
+
+# Benchmark: memory per Streamlit replica and latency under concurrent sessions,
+# replicas loading everything themselves ("local") vs. using the shared model server.
+BENCH_SOCKET = os.path.join(os.path.dirname(SOCKET_PATH), "bench.sock")
+
+
+def rss_mb(pid="self"):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+# ---------- Replica Process ----------
+# Simulates one app.py worker: load resources (or connect), then serve its share of notes
+def replica(mode, notes, data_path, clinicalbert, ner_backend, ready, start, results):
+    if mode == "local":
+        resources = SharedResources(data_path, clinicalbert, ner_backend)
+        predict = resources.match_prediction
+        ner = (lambda note: resources.ner_batch([note])[0]) if clinicalbert else None
+    else:
+        client = ModelServerClient(BENCH_SOCKET)
+        client.ping()
+        predict = client.match_prediction
+        ner = client.extract_entities if clinicalbert else None
+
+    memory = rss_mb()
+    ready.wait()
+    start.wait()
+
+    latencies = []
+    for note in notes:
+        t0 = time.perf_counter()
+        predict(note)
+        if ner:
+            ner(note)
+        latencies.append((time.perf_counter() - t0) * 1000)
+    results.put((memory, latencies))
+
+
+def run_mode(mode, replicas, notes, data_path, clinicalbert, ner_backend):
+    ctx = mp.get_context("spawn")
+    ready = ctx.Barrier(replicas + 1)
+    start = ctx.Event()
+    results = ctx.Queue()
+    procs = [
+        ctx.Process(target=replica, args=(mode, notes, data_path, clinicalbert, ner_backend,
+                                                 ready, start, results))
+        for _ in range(replicas)
+    ]
+    for p in procs:
+        p.start()
+    ready.wait()
+
+    t0 = time.perf_counter()
+    start.set()
+    collected = [results.get() for _ in procs]
+    elapsed = time.perf_counter() - t0
+    for p in procs:
+        p.join()
+
+    memories = [m for m, _ in collected]
+    latencies = [l for _, lat in collected for l in lat]
+    return {
+        "replica_rss_mb": np.mean(memories),
+        "p50_latency_ms": np.percentile(latencies, 50),
+        "p95_latency_ms": np.percentile(latencies, 95),
+        "throughput_notes_per_sec": len(latencies) / elapsed,
+    }
+
+
+# ---------- Main ----------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the shared model server")
+    parser.add_argument("--replicas", type=int, default=4, help="Concurrent app sessions/replicas")
+    parser.add_argument("--notes-per-replica", type=int, default=200)
+    parser.add_argument("--clinicalbert", action="store_true", help="Include ClinicalBERT NER")
+    parser.add_argument("--ner-backend", choices=["pytorch", "onnx"], default="pytorch")
+    parser.add_argument("--data", default=DATA_PATH)
+    args = parser.parse_args()
+
+    # Absolute path so the local replicas and the server read the same file
+    data_path = os.path.abspath(args.data)
+    reference = pd.read_csv(data_path)['clinical_note'].tolist()
+    notes = [reference[i % len(reference)] for i in range(args.notes_per_replica)]
+
+    local = run_mode("local", args.replicas, notes, data_path, args.clinicalbert, args.ner_backend)
+
+    server_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_server.py")
+    cmd = [sys.executable, server_script, "--socket", BENCH_SOCKET, "--data", data_path,
+           "--ner-backend", args.ner_backend]
+    if args.clinicalbert:
+        cmd.append("--clinicalbert")
+    server = subprocess.Popen(cmd)
+    try:
+        if not wait_for_server(BENCH_SOCKET, timeout=300, process=server):
+            raise RuntimeError("Model server did not start")
+        shared = run_mode("server", args.replicas, notes, data_path, args.clinicalbert, args.ner_backend)
+        server_rss = rss_mb(server.pid)
+    finally:
+        server.terminate()
+        server.wait()
+
+    local["node_total_rss_mb"] = local["replica_rss_mb"] * args.replicas
+    shared["server_rss_mb"] = server_rss
+    shared["node_total_rss_mb"] = shared["replica_rss_mb"] * args.replicas + server_rss
+
+    report = pd.DataFrame({"local": local, "shared_server": shared})
+    print(f"Replicas: {args.replicas} | notes per replica: {args.notes_per_replica} | "
+          f"ClinicalBERT: {args.clinicalbert}")
+    print(report)
+    report.to_csv("model_server_benchmark.csv")
@@ -0,0 +1,380 @@
+import os
+import sys
+import json
+import time
+import queue
+import socket
+import struct
+import asyncio
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+# Shared model/index server: holds the reference data, symptom index, knowledge graph
+# and (optionally) ClinicalBERT once per node, and serves every Streamlit replica over
+# a Unix socket. NER requests from all clients are batched before hitting ClinicalBERT;
+# the cheap index/KG lookups are answered directly.
+
+# ---------- Config ----------
+# Socket lives in a per-user 0700 directory so other local users cannot reach the notes
+def default_socket_path():
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(runtime_dir, f"clinical_model_server-{os.getuid()}", "server.sock")
+
+SOCKET_PATH = os.environ.get("MODEL_SERVER_SOCKET") or default_socket_path()
+DATA_PATH = os.environ.get("MODEL_SERVER_DATA", "sample_clinical_notes_with_predictions.csv")
+LOAD_CLINICALBERT = os.environ.get("MODEL_SERVER_CLINICALBERT", "0") == "1"
+NER_BACKEND = os.environ.get("MODEL_SERVER_NER_BACKEND", "pytorch")  # 'pytorch' or 'onnx', as in Stage 4
+UTILS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "utils")
+MAX_BATCH_SIZE = 32
+BATCH_WAIT_MS = 5
+CLIENT_POOL_SIZE = 4
+HEADER = struct.Struct("!I")
+
+# Symptom-disease relationships (same as Stage 3)
+symptom_disease_map = {
+    'chest pain': ['angina', 'heart attack', 'anxiety'],
+    'shortness of breath': ['COPD', 'asthma', 'pneumonia'],
+    'fatigue': ['depression', 'hypothyroidism', 'anemia'],
+    'nausea': ['food poisoning', 'pregnancy', 'migraine'],
+    'headache': ['migraine', 'tension headache', 'hypertension'],
+    'dizziness': ['vertigo', 'low blood pressure', 'anemia'],
+    'vomiting': ['food poisoning', 'migraine', 'pregnancy'],
+    'lack of appetite': ['depression', 'infection', 'cancer'],
+    'weakness': ['stroke', 'multiple sclerosis', 'anemia']
+}
+
+
+# ---------- Wire Protocol ----------
+# Every message is a 4-byte big-endian length followed by a UTF-8 JSON body
+def encode_message(payload):
+    body = json.dumps(payload).encode("utf-8")
+    return HEADER.pack(len(body)) + body
+
+
+def recv_exact(sock, size):
+    buf = b""
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise ConnectionError("Model server closed the connection")
+        buf += chunk
+    return buf
+
+
+# ---------- Shared Resources ----------
+class SharedResources:
+    def __init__(self, data_path=DATA_PATH, load_clinicalbert=LOAD_CLINICALBERT, ner_backend=NER_BACKEND,
+                 checkpoint_dir=None, onnx_dir=None):
+        import pandas as pd
+        import networkx as nx
+
+        data = pd.read_csv(data_path)
+        # Pre-lowered index so matching does no per-request string prep on the reference rows
+        self.index = [
+            (
+                row['clinical_note'].lower(),
+                [kw.strip().lower() for kw in row['extracted_symptoms'].split(",")],
+                row['extracted_symptoms'],
+                row['predicted_diseases'],
+            )
+            for _, row in data.iterrows()
+        ]
+
+        self.kg = nx.Graph()
+        for symptom, diseases in symptom_disease_map.items():
+            self.kg.add_node(symptom, type='symptom')
+            for disease in diseases:
+                self.kg.add_node(disease, type='disease')
+                self.kg.add_edge(symptom, disease, weight=1)
+
+        self.ner_pipeline = None
+        if load_clinicalbert:
+            # Same seeded checkpoint / ONNX export as Stage 4, so NER output matches it
+            from transformers import pipeline
+            sys.path.insert(0, UTILS_DIR)
+            import clinicalbert_onnx
+            if ner_backend == 'onnx':
+                tokenizer, model = clinicalbert_onnx.load_onnx_model(onnx_dir or clinicalbert_onnx.ONNX_MODEL_DIR)
+            elif ner_backend == 'pytorch':
+                tokenizer, model = clinicalbert_onnx.load_pytorch_model(checkpoint_dir or clinicalbert_onnx.CHECKPOINT_DIR)
+            else:
+                raise ValueError(f"Unknown NER backend: {ner_backend}")
+            self.ner_pipeline = pipeline("ner", model=model, tokenizer=tokenizer,
+                                         aggregation_strategy="simple")
+
+    # Same matching rules as match_prediction in app.py
+    def match_prediction(self, note):
+        note_lower = note.lower()
+        note_stripped = note_lower.strip()
+        for clinical_note, keywords, symptoms, diseases in self.index:
+            if note_stripped in clinical_note:
+                return symptoms, diseases
+            if any(kw in note_lower for kw in keywords):
+                return symptoms, diseases
+        return None, None
+
+    def match_batch(self, notes):
+        return [list(self.match_prediction(note)) for note in notes]
+
+    def query_diseases(self, symptoms):
+        diseases = set()
+        for symptom in symptoms:
+            if symptom in self.kg:
+                for neighbor in self.kg.neighbors(symptom):
+                    if self.kg.nodes[neighbor]['type'] == 'disease':
+                        diseases.add(neighbor)
+        return list(diseases)
+
+    # One pipeline call for the whole batch, so BERT sees a batch across all clients
+    def ner_batch(self, notes):
+        if self.ner_pipeline is None:
+            raise RuntimeError("ClinicalBERT is not loaded (set MODEL_SERVER_CLINICALBERT=1)")
+        outputs = self.ner_pipeline(notes, batch_size=len(notes))
+        return [
+            [
+                {**ent, 'score': float(ent['score'])}
+                for ent in entities
+                if ent['entity_group'] in ['SYMPTOM', 'DISEASE', 'BODY_PART']
+            ]
+            for entities in outputs
+        ]
+
+
+# ---------- Request Batching ----------
+class Batcher:
+    def __init__(self, batch_fn, executor):
+        self.batch_fn = batch_fn
+        self.executor = executor
+        self.queue = asyncio.Queue()
+
+    async def submit(self, item):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((item, future))
+        return await future
+
+    # Collect up to MAX_BATCH_SIZE requests (or wait BATCH_WAIT_MS) and run them together
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + BATCH_WAIT_MS / 1000
+            while len(batch) < MAX_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            items = [item for item, _ in batch]
+            try:
+                results = await loop.run_in_executor(self.executor, self.batch_fn, items)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+
+# ---------- Socket Safety ----------
+def prepare_socket_dir(socket_path):
+    socket_dir = os.path.dirname(os.path.abspath(socket_path))
+    os.makedirs(socket_dir, mode=0o700, exist_ok=True)
+    st = os.stat(socket_dir)
+    if st.st_uid != os.getuid() or st.st_mode & 0o022:
+        raise RuntimeError(f"Socket directory {socket_dir} must be owned by this user and not "
+                           f"writable by others")
+
+
+# Refuse to take over a socket that a live server still answers on; remove stale ones
+def claim_socket_path(socket_path):
+    if not os.path.exists(socket_path):
+        return
+    if server_available(socket_path):
+        raise RuntimeError(f"A model server is already running at {socket_path}")
+    os.unlink(socket_path)
+
+
+# ---------- Server ----------
+class ModelServer:
+    def __init__(self, resources, socket_path=SOCKET_PATH):
+        self.resources = resources
+        self.socket_path = socket_path
+        # NER gets its own single worker so a long BERT batch never blocks the cheap lookups;
+        # bulk matches run on a separate pool so a large upload never blocks the event loop
+        self.ner_executor = ThreadPoolExecutor(max_workers=1)
+        self.lookup_executor = ThreadPoolExecutor(max_workers=2)
+        self.ner_batcher = None
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                header = await reader.readexactly(HEADER.size)
+                (size,) = HEADER.unpack(header)
+                request = json.loads(await reader.readexactly(size))
+                try:
+                    response = {"result": await self.dispatch(request)}
+                except Exception as e:
+                    response = {"error": str(e)}
+                writer.write(encode_message(response))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    # Single index and KG lookups are microseconds of string work, so they run inline;
+    # bulk matches go to the lookup pool and only NER goes through the batcher
+    async def dispatch(self, request):
+        op = request.get("op")
+        payload = request.get("payload")
+        if op == "ping":
+            return {"pid": os.getpid(), "ner": self.resources.ner_pipeline is not None}
+        if op == "match":
+            return list(self.resources.match_prediction(payload))
+        if op == "match_many":
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.lookup_executor, self.resources.match_batch, payload)
+        if op == "kg":
+            return self.resources.query_diseases(payload)
+        if op == "ner":
+            return await self.ner_batcher.submit(payload)
+        raise ValueError(f"Unknown op: {op}")
+
+    async def serve(self):
+        self.ner_batcher = Batcher(self.resources.ner_batch, self.ner_executor)
+        ner_task = asyncio.create_task(self.ner_batcher.run())
+
+        prepare_socket_dir(self.socket_path)
+        claim_socket_path(self.socket_path)
+        old_umask = os.umask(0o177)
+        try:
+            server = await asyncio.start_unix_server(self.handle_client, path=self.socket_path)
+        finally:
+            os.umask(old_umask)
+        os.chmod(self.socket_path, 0o600)
+        socket_inode = os.stat(self.socket_path).st_ino
+        print(f"Model server (pid {os.getpid()}) listening on {self.socket_path}", flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            ner_task.cancel()
+            # Only remove the socket if it is still ours
+            if os.path.exists(self.socket_path) and os.stat(self.socket_path).st_ino == socket_inode:
+                os.unlink(self.socket_path)
+
+
+# ---------- Client ----------
+# Small pool of connections per replica, so concurrent Streamlit sessions are not
+# serialised behind one socket
+class ModelServerClient:
+    def __init__(self, socket_path=SOCKET_PATH, pool_size=CLIENT_POOL_SIZE, timeout=30):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.pool = queue.LifoQueue()
+        for _ in range(pool_size):
+            self.pool.put(None)
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        return sock
+
+    def close(self):
+        while True:
+            try:
+                sock = self.pool.get_nowait()
+            except queue.Empty:
+                return
+            if sock is not None:
+                sock.close()
+
+    def request(self, op, payload=None):
+        sock = self.pool.get()
+        try:
+            if sock is None:
+                sock = self.connect()
+            sock.sendall(encode_message({"op": op, "payload": payload}))
+            (size,) = HEADER.unpack(recv_exact(sock, HEADER.size))
+            response = json.loads(recv_exact(sock, size))
+        except (OSError, ConnectionError):
+            if sock is not None:
+                sock.close()
+            sock = None
+            raise
+        finally:
+            self.pool.put(sock)
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return response["result"]
+
+    def ping(self):
+        return self.request("ping")
+
+    def match_prediction(self, note):
+        symptoms, diseases = self.request("match", note)
+        return symptoms, diseases
+
+    # One round trip for a whole bulk upload
+    def match_many(self, notes):
+        return [tuple(result) for result in self.request("match_many", list(notes))]
+
+    def query_diseases(self, symptoms):
+        return self.request("kg", symptoms)
+
+    def extract_entities(self, note):
+        return self.request("ner", note)
+
+
+# True only if a live server answers at the path - a leftover socket file is not enough
+def server_available(socket_path=SOCKET_PATH, timeout=2):
+    if not os.path.exists(socket_path):
+        return False
+    client = ModelServerClient(socket_path, pool_size=1, timeout=timeout)
+    try:
+        client.ping()
+        return True
+    except (OSError, RuntimeError):
+        return False
+    finally:
+        client.close()
+
+
+# Pass the server's Popen as process to fail fast if it exits before answering
+def wait_for_server(socket_path=SOCKET_PATH, timeout=60, process=None):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Model server exited with code {process.returncode} before it started")
+        if server_available(socket_path):
+            return True
+        time.sleep(0.1)
+    return False
+
+
+# ---------- Main ----------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared model/index server for the Streamlit app")
+    parser.add_argument("--socket", default=SOCKET_PATH)
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--clinicalbert", action="store_true", default=LOAD_CLINICALBERT,
+                        help="Also load ClinicalBERT and serve batched NER requests")
+    parser.add_argument("--ner-backend", choices=["pytorch", "onnx"], default=NER_BACKEND)
+    parser.add_argument("--checkpoint-dir", default=None, help="ClinicalBERT checkpoint saved by utils/4a")
+    parser.add_argument("--onnx-dir", default=None, help="ONNX export written by utils/4a")
+    args = parser.parse_args()
+
+    resources = SharedResources(args.data, args.clinicalbert, args.ner_backend,
+                                args.checkpoint_dir, args.onnx_dir)
+    asyncio.run(ModelServer(resources, args.socket).serve())
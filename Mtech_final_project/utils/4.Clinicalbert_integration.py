@@ -1,16 +1,23 @@
-from transformers import AutoTokenizer, AutoModelForTokenClassification
 from transformers import pipeline
 import torch
 import pandas as pd
+from clinicalbert_onnx import load_pytorch_model, load_onnx_model
+
+# NER backend: 'pytorch' (eager transformers) or 'onnx' (ONNX Runtime, see 4a.Clinicalbert_onnx_export.py)
+NER_BACKEND = 'pytorch'
 
 # Load preprocessed data
 df = pd.read_csv('preprocessed_notes.csv')
 
 # Load ClinicalBERT model for NER
-def load_clinicalbert_model():
-    model_name = "emilyalsentzer/Bio_ClinicalBERT"
-    tokenizer = AutoTokenizer.from_pretrained(model_name)
-    model = AutoModelForTokenClassification.from_pretrained(model_name)
+def load_clinicalbert_model(backend=NER_BACKEND):
+    # Both backends use the same saved checkpoint, so they share one classification head
+    if backend == 'onnx':
+        tokenizer, model = load_onnx_model()
+    elif backend == 'pytorch':
+        tokenizer, model = load_pytorch_model()
+    else:
+        raise ValueError(f"Unknown NER backend: {backend}")
     
     # Create NER pipeline
     ner_pipeline = pipeline(
@@ -0,0 +1,59 @@
+import os
+import argparse
+from transformers import AutoTokenizer
+from clinicalbert_onnx import CHECKPOINT_DIR, ONNX_MODEL_DIR, create_checkpoint, write_export_info
+from optimum.onnxruntime import ORTModelForTokenClassification, ORTOptimizer, ORTQuantizer
+from optimum.onnxruntime.configuration import AutoQuantizationConfig, OptimizationConfig
+
+# Export ClinicalBERT token classification model to ONNX for the 'onnx' NER backend in Stage 4.
+# The export is taken from the saved PyTorch checkpoint, so both backends share one head.
+def parse_args():
+    parser = argparse.ArgumentParser(description="Export ClinicalBERT NER model to ONNX")
+    parser.add_argument('--checkpoint-dir', default=CHECKPOINT_DIR)
+    parser.add_argument('--output-dir', default=ONNX_MODEL_DIR)
+    parser.add_argument('--new-checkpoint', action='store_true',
+                        help="Re-create the PyTorch checkpoint (re-initialises the classification head)")
+    parser.add_argument('--optimize', type=int, choices=[0, 1, 2, 99], default=0,
+                        help="ONNX Runtime graph optimization level (0 = skip)")
+    parser.add_argument('--quantize', action='store_true',
+                        help="Apply dynamic int8 quantization for CPU inference")
+    parser.add_argument('--quantize-arch', choices=['avx2', 'avx512', 'avx512_vnni', 'arm64'],
+                        default='avx512_vnni', help="Target CPU instruction set for int8 kernels")
+    return parser.parse_args()
+
+# Plain ONNX export of the saved PyTorch checkpoint
+def export_model(checkpoint_dir, output_dir):
+    tokenizer = AutoTokenizer.from_pretrained(checkpoint_dir)
+    model = ORTModelForTokenClassification.from_pretrained(checkpoint_dir, export=True)
+    model.save_pretrained(output_dir)
+    tokenizer.save_pretrained(output_dir)
+    return model
+
+# Fuse attention / GELU / LayerNorm nodes (writes model_optimized.onnx)
+def optimize_model(model, output_dir, level):
+    optimizer = ORTOptimizer.from_pretrained(model)
+    config = OptimizationConfig(optimization_level=level, optimize_for_gpu=False)
+    optimizer.optimize(save_dir=output_dir, optimization_config=config)
+    return 'model_optimized.onnx'
+
+# Dynamic int8 quantization of the weights (writes <file>_quantized.onnx)
+def quantize_model(output_dir, file_name, arch):
+    quantizer = ORTQuantizer.from_pretrained(output_dir, file_name=file_name)
+    config = getattr(AutoQuantizationConfig, arch)(is_static=False, per_channel=False)
+    quantizer.quantize(save_dir=output_dir, quantization_config=config)
+    return file_name.replace('.onnx', '_quantized.onnx')
+
+# Main execution
+if __name__ == '__main__':
+    args = parse_args()
+    if args.new_checkpoint or not os.path.isdir(args.checkpoint_dir):
+        create_checkpoint(checkpoint_dir=args.checkpoint_dir)
+    model = export_model(args.checkpoint_dir, args.output_dir)
+    file_name = 'model.onnx'
+    if args.optimize:
+        file_name = optimize_model(model, args.output_dir, args.optimize)
+    if args.quantize:
+        file_name = quantize_model(args.output_dir, file_name, args.quantize_arch)
+    write_export_info(args.output_dir, file_name)
+    print(f"Exported ONNX model: {args.output_dir}/{file_name} (from {args.checkpoint_dir})")
+    print("Set NER_BACKEND = 'onnx' in Stage 4 to use it; Stage 4 and 4b pick up this file automatically")
@@ -0,0 +1,82 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from transformers import pipeline
+from clinicalbert_onnx import CHECKPOINT_DIR, ONNX_MODEL_DIR, load_pytorch_model, load_onnx_model, read_export_info, require_dir
+
+# Parity check and latency/throughput comparison of the PyTorch and ONNX NER backends
+SCORE_TOLERANCE = 0.05    # int8 models shift scores slightly; labels and spans must match exactly
+WARMUP_RUNS = 3
+BENCHMARK_RUNS = 20
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Compare PyTorch and ONNX ClinicalBERT NER backends")
+    parser.add_argument('--checkpoint-dir', default=CHECKPOINT_DIR)
+    parser.add_argument('--onnx-dir', default=ONNX_MODEL_DIR)
+    parser.add_argument('--onnx-file', default=None,
+                        help="ONNX file inside --onnx-dir (default: the file written by the last 4a export)")
+    parser.add_argument('--notes', default='preprocessed_notes.csv')
+    return parser.parse_args()
+
+def build_pipeline(tokenizer, model):
+    return pipeline("ner", model=model, tokenizer=tokenizer, aggregation_strategy="simple")
+
+# Compare entity output of both backends note by note
+def check_parity(notes, torch_pipeline, onnx_pipeline):
+    mismatches = []
+    for note in notes:
+        torch_ents = torch_pipeline(note)
+        onnx_ents = onnx_pipeline(note)
+        same_spans = [(e['entity_group'], e['word'], e['start'], e['end']) for e in torch_ents] == \
+                     [(e['entity_group'], e['word'], e['start'], e['end']) for e in onnx_ents]
+        same_scores = same_spans and all(
+            abs(float(t['score']) - float(o['score'])) <= SCORE_TOLERANCE
+            for t, o in zip(torch_ents, onnx_ents)
+        )
+        if not same_scores:
+            mismatches.append({'note_text': note, 'pytorch': torch_ents, 'onnx': onnx_ents})
+    return mismatches
+
+# Per-note latency (ms) and overall throughput (notes/sec)
+def benchmark(ner_pipeline, notes):
+    for note in notes[:WARMUP_RUNS]:
+        ner_pipeline(note)
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(BENCHMARK_RUNS):
+        for note in notes:
+            t0 = time.perf_counter()
+            ner_pipeline(note)
+            latencies.append((time.perf_counter() - t0) * 1000)
+    elapsed = time.perf_counter() - start
+    return {
+        'p50_latency_ms': np.percentile(latencies, 50),
+        'p95_latency_ms': np.percentile(latencies, 95),
+        'throughput_notes_per_sec': len(latencies) / elapsed
+    }
+
+# Main execution
+args = parse_args()
+# Both must come from the same 4a run, otherwise parity compares two different heads
+require_dir(args.checkpoint_dir, "ClinicalBERT checkpoint")
+require_dir(args.onnx_dir, "ONNX export")
+onnx_file = args.onnx_file or read_export_info(args.onnx_dir)
+notes = pd.read_csv(args.notes)['note_text'].tolist()
+torch_pipeline = build_pipeline(*load_pytorch_model(args.checkpoint_dir))
+onnx_pipeline = build_pipeline(*load_onnx_model(args.onnx_dir, onnx_file))
+
+mismatches = check_parity(notes, torch_pipeline, onnx_pipeline)
+print(f"Parity: {len(notes) - len(mismatches)}/{len(notes)} notes match")
+for mismatch in mismatches:
+    print(mismatch)
+
+results = pd.DataFrame({
+    'pytorch': benchmark(torch_pipeline, notes),
+    f'onnx ({onnx_file})': benchmark(onnx_pipeline, notes)
+})
+results.loc['speedup'] = results.loc['throughput_notes_per_sec'] / results.loc['throughput_notes_per_sec', 'pytorch']
+results.to_csv('clinicalbert_onnx_benchmark.csv')
+print(results)
+
+assert not mismatches, "ONNX backend entity output does not match the PyTorch pipeline"
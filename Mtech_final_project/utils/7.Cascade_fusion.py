@@ -0,0 +1,241 @@
+import os
+import time
+import pandas as pd
+import networkx as nx
+from transformers import pipeline
+from clinicalbert_onnx import load_pytorch_model
+
+# Cascade settings: a note is only sent to ClinicalBERT when the KG answer is not decisive
+TOP_K = 3                  # number of diseases we report per note
+MARGIN_THRESHOLD = 0.25    # min gap between the k-th and (k+1)-th KG score
+COVERAGE_THRESHOLD = 0.2   # min share of note words explained by known symptoms
+HOLDOUT_PATH = 'holdout_notes_with_disease_predictions.csv'  # notes not used to set the thresholds
+MIN_HOLDOUT_NOTES = 50     # below this the throughput/agreement numbers are only indicative
+TIMING_REPEATS = 5
+
+# Load data from previous stages (rule-based NER + KG predictions)
+df = pd.read_csv('notes_with_disease_predictions.csv')
+
+# Symptom-disease relationships (same as Stage 3)
+symptom_disease_map = {
+    'chest pain': ['angina', 'heart attack', 'anxiety'],
+    'shortness of breath': ['COPD', 'asthma', 'pneumonia'],
+    'fatigue': ['depression', 'hypothyroidism', 'anemia'],
+    'nausea': ['food poisoning', 'pregnancy', 'migraine'],
+    'headache': ['migraine', 'tension headache', 'hypertension'],
+    'dizziness': ['vertigo', 'low blood pressure', 'anemia'],
+    'vomiting': ['food poisoning', 'migraine', 'pregnancy'],
+    'lack of appetite': ['depression', 'infection', 'cancer'],
+    'weakness': ['stroke', 'multiple sclerosis', 'anemia']
+}
+
+# Create knowledge graph (same as Stage 3)
+def build_knowledge_graph():
+    G = nx.Graph()
+    for symptom, diseases in symptom_disease_map.items():
+        G.add_node(symptom, type='symptom', color='lightblue')
+        for disease in diseases:
+            G.add_node(disease, type='disease', color='lightgreen')
+            G.add_edge(symptom, disease, weight=1)
+    return G
+
+# Score diseases by the share of the note's symptoms that point to them
+def score_diseases(G, symptoms):
+    scores = {}
+    known = [s for s in symptoms if s in G]
+    for symptom in known:
+        for neighbor in G.neighbors(symptom):
+            if G.nodes[neighbor]['type'] == 'disease':
+                scores[neighbor] = scores.get(neighbor, 0) + 1
+    if known:
+        scores = {d: s / len(known) for d, s in scores.items()}
+    return sorted(scores.items(), key=lambda x: x[1], reverse=True)
+
+# Gap at the top-k cut. Every KG edge has weight 1, so scores tie a lot; a tie across the
+# cut gives 0, because picking among tied diseases is exactly what the BERT stage is for.
+# With fewer than k candidates the cut is after the last one (gap to 0).
+def top_k_margin(scored, k=TOP_K):
+    values = [s for _, s in scored] + [0.0]
+    c = min(k, len(scored))
+    if c == 0:
+        return 0.0
+    return values[c - 1] - values[c]
+
+# Share of the cleaned note words covered by the matched symptom keywords
+def symptom_coverage(cleaned_text, symptoms):
+    words = str(cleaned_text).split()
+    if not words:
+        return 0.0
+    symptom_words = set(w for s in symptoms for w in s.split())
+    covered = [w for w in words if w in symptom_words]
+    return len(covered) / len(words)
+
+# Decide whether the note needs the BERT stage
+def needs_bert(margin, coverage):
+    return margin < MARGIN_THRESHOLD or coverage < COVERAGE_THRESHOLD
+
+# Load ClinicalBERT model for NER (same checkpoint as Stage 4)
+def load_clinicalbert_model():
+    tokenizer, model = load_pytorch_model()
+    ner_pipeline = pipeline(
+        "ner",
+        model=model,
+        tokenizer=tokenizer,
+        aggregation_strategy="simple"
+    )
+    return ner_pipeline
+
+# Extract medical entities using ClinicalBERT (same as Stage 4)
+def extract_entities(text, ner_pipeline):
+    entities = ner_pipeline(text)
+    medical_entities = [
+        ent for ent in entities
+        if ent['entity_group'] in ['SYMPTOM', 'DISEASE', 'BODY_PART']
+    ]
+    return medical_entities
+
+# Map BERT entities to diseases (same as Stage 5)
+def simulate_bert_disease_predictions(entities):
+    disease_keywords = ['angina', 'heart attack', 'COPD', 'asthma', 'pneumonia',
+                       'depression', 'hypothyroidism', 'food poisoning', 'migraine']
+    predicted = []
+    for ent in entities:
+        if ent['entity_group'] == 'DISEASE':
+            predicted.append(ent['word'])
+        elif ent['word'].lower() in disease_keywords:
+            predicted.append(ent['word'])
+    return list(set(predicted))
+
+# Decision fusion function (same as Stage 5)
+def fuse_predictions(kg_diseases, bert_diseases, kg_weight=0.6, bert_weight=0.4):
+    all_diseases = list(set(kg_diseases + bert_diseases))
+    scores = {}
+    for disease in all_diseases:
+        kg_score = kg_weight if disease in kg_diseases else 0
+        bert_score = bert_weight if disease in bert_diseases else 0
+        scores[disease] = kg_score + bert_score
+    sorted_diseases = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+    return sorted_diseases
+
+# Fused top-k ranked by fused score, then KG score. Diseases still tied with the k-th
+# one are all kept rather than letting name order decide which of them make the cut.
+def fused_top_k(kg_scores, bert_diseases, k=TOP_K):
+    kg_lookup = dict(kg_scores)
+    fused = fuse_predictions([d for d, _ in kg_scores], bert_diseases)
+    rank = lambda x: (x[1], kg_lookup.get(x[0], 0))
+    fused = sorted(fused, key=lambda x: (rank(x), x[0]), reverse=True)
+    if len(fused) <= k:
+        return fused
+    cutoff = rank(fused[k - 1])
+    return [x for x in fused if rank(x) >= cutoff]
+
+# Run the cheap KG stage on one note and decide the routing
+def score_note(row, kg):
+    symptoms = eval(row['extracted_symptoms']) if isinstance(row['extracted_symptoms'], str) else row['extracted_symptoms']
+    scored = score_diseases(kg, symptoms)
+    margin = top_k_margin(scored)
+    coverage = symptom_coverage(row['cleaned_text'], symptoms)
+    return {
+        'note_id': row['note_id'],
+        'kg_scores': scored,
+        'kg_margin': margin,
+        'symptom_coverage': coverage,
+        'routed_to_bert': needs_bert(margin, coverage)
+    }
+
+def score_notes(df, kg):
+    return pd.DataFrame([score_note(row, kg) for _, row in df.iterrows()])
+
+# KG scoring + routing, then BERT only for the notes that were routed to it
+def cascade_predict(df, kg, ner_pipeline):
+    predictions = []
+    for _, row in df.iterrows():
+        route = score_note(row, kg)
+        bert_diseases = []
+        if route['routed_to_bert']:
+            entities = extract_entities(row['note_text'], ner_pipeline)
+            bert_diseases = simulate_bert_disease_predictions(entities)
+        predictions.append(fused_top_k(route['kg_scores'], bert_diseases))
+    return predictions
+
+# Full fusion baseline: KG scoring and BERT for every note
+def full_fusion_predict(df, kg, ner_pipeline):
+    predictions = []
+    for _, row in df.iterrows():
+        route = score_note(row, kg)
+        entities = extract_entities(row['note_text'], ner_pipeline)
+        bert_diseases = simulate_bert_disease_predictions(entities)
+        predictions.append(fused_top_k(route['kg_scores'], bert_diseases))
+    return predictions
+
+# Overlap between the cascade and full fusion top-k disease sets
+def top_k_agreement(cascade_preds, full_preds):
+    overlaps = []
+    for cascade, full in zip(cascade_preds, full_preds):
+        cascade_set = set(d for d, _ in cascade)
+        full_set = set(d for d, _ in full)
+        union = cascade_set | full_set
+        overlaps.append(len(cascade_set & full_set) / len(union) if union else 1.0)
+    return sum(overlaps) / len(overlaps) if overlaps else 1.0
+
+# Time a prediction function over TIMING_REPEATS runs and return (predictions, notes per second).
+# One warm-up note first, so neither mode pays the pipeline's first-call cost.
+def timed(predict_fn, df, kg, ner_pipeline):
+    predict_fn(df.head(1), kg, ner_pipeline)
+    start = time.perf_counter()
+    for _ in range(TIMING_REPEATS):
+        predictions = predict_fn(df, kg, ner_pipeline)
+    elapsed = time.perf_counter() - start
+    return predictions, len(df) * TIMING_REPEATS / elapsed if elapsed > 0 else float('inf')
+
+# The thresholds were set on the notes in df, so only a separate file is a held-out set;
+# without it the comparison runs on df and is reported as in-sample
+def load_evaluation_set(df):
+    if os.path.exists(HOLDOUT_PATH):
+        return pd.read_csv(HOLDOUT_PATH), 'held-out'
+    return df, 'in-sample'
+
+# Main execution
+kg = build_knowledge_graph()
+routing = score_notes(df, kg)
+
+# Only pay for loading ClinicalBERT when at least one note needs it
+ner_pipeline = load_clinicalbert_model() if routing['routed_to_bert'].any() else None
+
+df['kg_margin'] = routing['kg_margin'].values
+df['symptom_coverage'] = routing['symptom_coverage'].values
+df['routed_to_bert'] = routing['routed_to_bert'].values
+df['cascade_predictions'] = cascade_predict(df, kg, ner_pipeline)
+df.to_csv('cascade_predictions.csv', index=False)
+
+# Compare cascade against full fusion
+eval_df, eval_set = load_evaluation_set(df)
+eval_routing = score_notes(eval_df, kg)
+if ner_pipeline is None:
+    ner_pipeline = load_clinicalbert_model()
+cascade_preds, cascade_throughput = timed(cascade_predict, eval_df, kg, ner_pipeline)
+full_preds, full_throughput = timed(full_fusion_predict, eval_df, kg, ner_pipeline)
+
+report = {
+    'notes': len(df),
+    'fraction_routed_to_bert': df['routed_to_bert'].mean(),
+    'evaluation_set': eval_set,
+    'evaluation_notes': len(eval_df),
+    'evaluation_fraction_routed_to_bert': eval_routing['routed_to_bert'].mean(),
+    'full_fusion_notes_per_sec': full_throughput,
+    'cascade_notes_per_sec': cascade_throughput,
+    'throughput_gain': cascade_throughput / full_throughput,
+    'top_k_agreement_with_full_fusion': top_k_agreement(cascade_preds, full_preds)
+}
+report_df = pd.DataFrame.from_dict(report, orient='index', columns=['Value'])
+report_df.to_csv('cascade_report.csv')
+
+print("Cascade Fusion Report:")
+print(report_df)
+if eval_set == 'in-sample':
+    print(f"Warning: no {HOLDOUT_PATH} found - agreement and throughput are in-sample, measured on "
+          f"the notes the thresholds were set on")
+elif len(eval_df) < MIN_HOLDOUT_NOTES:
+    print(f"Warning: held-out set has only {len(eval_df)} notes - throughput gain and agreement "
+          f"are indicative only (use >= {MIN_HOLDOUT_NOTES} notes)")
+print(df[['note_id', 'kg_margin', 'symptom_coverage', 'routed_to_bert', 'cascade_predictions']].head())
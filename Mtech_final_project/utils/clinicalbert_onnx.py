@@ -0,0 +1,72 @@
+import os
+import json
+from transformers import AutoTokenizer, AutoModelForTokenClassification
+
+# Shared ClinicalBERT checkpoint / ONNX Runtime settings for Stage 4, 4a (export) and 4b (benchmark)
+MODEL_NAME = "emilyalsentzer/Bio_ClinicalBERT"
+CHECKPOINT_DIR = 'clinicalbert_ner'    # PyTorch checkpoint saved by 4a, incl. its token classification head
+ONNX_MODEL_DIR = 'clinicalbert_onnx'
+EXPORT_INFO_FILE = 'export_info.json'  # records which .onnx file 4a produced last
+ONNX_INTRA_OP_THREADS = 0              # 0 lets ONNX Runtime use all physical cores
+ONNX_INTER_OP_THREADS = 1
+SEED = 42
+
+# Bio_ClinicalBERT is a base checkpoint: the token classification head is newly initialised,
+# so it is seeded and saved once by 4a, and every backend must load from CHECKPOINT_DIR
+def create_checkpoint(model_name=MODEL_NAME, checkpoint_dir=CHECKPOINT_DIR):
+    import torch
+    torch.manual_seed(SEED)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForTokenClassification.from_pretrained(model_name)
+    model.save_pretrained(checkpoint_dir)
+    tokenizer.save_pretrained(checkpoint_dir)
+    return checkpoint_dir
+
+# Never create the checkpoint implicitly: a fresh one would have a different head than
+# the one the ONNX model was exported from
+def require_dir(path, what):
+    if not os.path.isdir(path):
+        raise FileNotFoundError(f"No {what} found in {os.path.abspath(path)}; "
+                                f"run 4a.Clinicalbert_onnx_export.py first")
+
+def load_pytorch_model(checkpoint_dir=CHECKPOINT_DIR):
+    require_dir(checkpoint_dir, "ClinicalBERT checkpoint")
+    tokenizer = AutoTokenizer.from_pretrained(checkpoint_dir)
+    model = AutoModelForTokenClassification.from_pretrained(checkpoint_dir)
+    return tokenizer, model
+
+def write_export_info(model_dir, file_name):
+    with open(os.path.join(model_dir, EXPORT_INFO_FILE), 'w') as f:
+        json.dump({'file_name': file_name}, f)
+
+def read_export_info(model_dir=ONNX_MODEL_DIR):
+    path = os.path.join(model_dir, EXPORT_INFO_FILE)
+    if not os.path.exists(path):
+        return 'model.onnx'
+    with open(path) as f:
+        return json.load(f)['file_name']
+
+# ONNX Runtime session tuned for CPU-only inference nodes
+def create_onnx_session_options():
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.intra_op_num_threads = ONNX_INTRA_OP_THREADS
+    options.inter_op_num_threads = ONNX_INTER_OP_THREADS
+    options.enable_cpu_mem_arena = True
+    options.enable_mem_pattern = True
+    return options
+
+# Load the exported model through ONNX Runtime (file_name=None uses the last export)
+def load_onnx_model(model_dir=ONNX_MODEL_DIR, file_name=None):
+    from optimum.onnxruntime import ORTModelForTokenClassification
+    require_dir(model_dir, "ONNX export")
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    model = ORTModelForTokenClassification.from_pretrained(
+        model_dir,
+        file_name=file_name or read_export_info(model_dir),
+        provider="CPUExecutionProvider",
+        session_options=create_onnx_session_options()
+    )
+    return tokenizer, model